@@ -0,0 +1,48 @@
+import hashlib
+
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from foodgram import settings as s
+
+
+def get_token_key(key):
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def get_user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_token(token_key, user_id):
+    """token_key — ключ кэша из get_token_key, а не сам токен."""
+
+    cache.delete_many((token_key, get_user_key(user_id)))
+
+
+def forget_user(user_id):
+    token_key = cache.get(get_user_key(user_id))
+    if token_key is not None:
+        forget_token(token_key, user_id)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который запоминает пользователя по токену.
+
+    Запрос Token + User выполняется один раз в TOKEN_CACHE_TIMEOUT
+    секунд. Кэш сбрасывается при удалении токена (выход) и сохранении
+    пользователя (смена пароля, блокировка), см. api.signals. Сам токен
+    в кэш не попадает, только его sha256.
+    """
+
+    def authenticate_credentials(self, key):
+        token_key = get_token_key(key)
+        user = cache.get(token_key)
+        if user is not None:
+            return user, self.get_model()(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        cache.set_many({
+            token_key: user,
+            get_user_key(user.id): token_key,
+        }, s.TOKEN_CACHE_TIMEOUT)
+        return user, token
@@ -0,0 +1,72 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from foodgram import settings as s
+
+
+def get_version_key(model):
+    return f'catalog:{model._meta.label_lower}:version'
+
+
+def get_catalog_version(model):
+    """Метка последнего изменения справочника, общая для всех ответов.
+
+    Метка живёт CATALOG_VERSION_TIMEOUT секунд: изменения из другого
+    процесса (load_ingrs, другой воркер с кэшем в памяти) становятся
+    видны не позже, чем через это время.
+    """
+
+    key = get_version_key(model)
+    version = cache.get(key)
+    if version is not None:
+        return version
+    version = time.time()
+    if cache.add(key, version, s.CATALOG_VERSION_TIMEOUT):
+        return version
+    return cache.get(key, version)
+
+
+def touch_catalog(model):
+    cache.set(get_version_key(model), time.time(), s.CATALOG_VERSION_TIMEOUT)
+
+
+class CatalogCacheMixin:
+    """Кэширует list/retrieve справочника и отвечает 304 без запроса к БД.
+
+    Кэш сбрасывается сигналами при изменении модели (см. api.signals).
+    """
+
+    def get_cached_response(self, request, build):
+        version = get_catalog_version(self.queryset.model)
+        digest = hashlib.md5(
+            f'{version}:{request.get_full_path()}'.encode()).hexdigest()
+        etag = quote_etag(digest)
+        last_modified = int(version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            key = f'catalog:{self.queryset.model._meta.label_lower}:{digest}'
+            data = cache.get(key)
+            if data is None:
+                data = build()
+                cache.set(key, data, s.CATALOG_CACHE_TIMEOUT)
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return self.get_cached_response(
+            request, lambda: build(request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        build = super().retrieve
+        return self.get_cached_response(
+            request, lambda: build(request, *args, **kwargs).data)
@@ -0,0 +1,128 @@
+import base64
+import binascii
+import uuid
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+from foodgram import settings as s
+
+CHUNK_SIZE = 64 * 1024
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """Картинка в base64 (data:image/...;base64,...) или файлом multipart.
+
+    base64 декодируется частями во временный файл, который переходит
+    на диск после IMAGE_SPOOL_SIZE байт, поэтому вторая полная копия
+    картинки в памяти не создаётся. Размер проверяется до декодирования,
+    а число пикселей — по заголовку картинки, до чтения всего файла.
+    """
+
+    default_error_messages = {
+        'invalid_base64': 'Картинка должна быть в формате base64.',
+        'max_bytes': 'Картинка больше {max_megabytes} МБ.',
+        'max_pixels': 'Картинка больше {max_megapixels} мегапикселей.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('http'):
+            raise SkipField()
+        if isinstance(data, str):
+            return self.check_image(self.decode(data))
+        if getattr(data, 'size', 0) > s.RECIPE_IMAGE_MAX_BYTES:
+            self.fail_max_bytes()
+        data = super().to_internal_value(data)
+        return self.check_image(data)
+
+    def fail_max_bytes(self):
+        self.fail(
+            'max_bytes',
+            max_megabytes=s.RECIPE_IMAGE_MAX_BYTES // (1024 * 1024))
+
+    def decode(self, data):
+        marker = ';base64,'
+        offset = data.find(marker)
+        if not data.startswith('data:') or offset < 0:
+            self.fail('invalid_base64')
+        header, offset = data[:offset], offset + len(marker)
+        if (len(data) - offset) // 4 * 3 > s.RECIPE_IMAGE_MAX_BYTES:
+            self.fail_max_bytes()
+        spool = SpooledTemporaryFile(max_size=s.IMAGE_SPOOL_SIZE)
+        try:
+            for start in range(offset, len(data), CHUNK_SIZE):
+                spool.write(base64.b64decode(
+                    data[start:start + CHUNK_SIZE], validate=True))
+        except (binascii.Error, ValueError):
+            spool.close()
+            self.fail('invalid_base64')
+        spool.seek(0)
+        extension = header.rpartition('/')[2] or 'jpg'
+        return File(spool, name=f'{uuid.uuid4().hex}.{extension}')
+
+    def check_image(self, file):
+        try:
+            file.seek(0)
+            with Image.open(file) as image:
+                width, height = image.size
+                if width * height > s.RECIPE_IMAGE_MAX_PIXELS:
+                    self.fail(
+                        'max_pixels',
+                        max_megapixels=s.RECIPE_IMAGE_MAX_PIXELS // 10 ** 6)
+                image.verify()
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        file.seek(0)
+        return file
+
+
+@lru_cache(maxsize=None)
+def get_storage_base_url(storage):
+    """base_url хранилища, если url() файла — это base_url + имя.
+
+    Для остальных бэкендов (подписанные ссылки и т. п.) возвращает None,
+    и URL строится самим хранилищем.
+    """
+
+    if isinstance(storage, FileSystemStorage):
+        return storage.base_url
+    return None
+
+
+class ImageURLField(serializers.Field):
+    """Ссылка на картинку только для чтения.
+
+    Вывод совпадает с serializers.ImageField(use_url=True), но общая
+    часть абсолютного URL вычисляется один раз на хранилище и запрос,
+    а для каждого файла к ней только дописывается имя.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+        self.prefixes = {}
+
+    def get_prefix(self, storage):
+        if storage not in self.prefixes:
+            base_url = get_storage_base_url(storage)
+            request = self.context.get('request')
+            if base_url is not None and request is not None:
+                base_url = request.build_absolute_uri(base_url)
+            self.prefixes[storage] = base_url
+        return self.prefixes[storage]
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        prefix = self.get_prefix(value.storage)
+        if prefix is None or '..' in value.name:
+            url = value.url
+            request = self.context.get('request')
+            return request.build_absolute_uri(url) if request else url
+        return prefix + filepath_to_uri(value.name).lstrip('/')
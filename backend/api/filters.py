@@ -1,8 +1,13 @@
 import django_filters as filters
 from django.core.exceptions import ValidationError
-from recipes.models import Ingredient, Recipe, Tag
+from django.db.models import Exists, OuterRef
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe, ShoppingCart,
+                            Tag)
 from users.models import User
 
+from api.ingredient_index import ingredient_index, search_ingredients
+from foodgram import settings as s
+
 
 class MultipleChoiceFieldForTags(
         filters.fields.MultipleChoiceField):
@@ -24,28 +29,68 @@ class TagsFilter(filters.AllValuesMultipleFilter):
 
 
 class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith')
+    name = filters.CharFilter(method='filter_name')
+    search = filters.CharFilter(
+        method='filter_search',
+        label='Поиск по началу, части названия и с опечатками')
 
     class Meta:
         model = Ingredient
-        fields = ('name',)
+        fields = ('name', 'search')
+
+    def filter_name(self, queryset, name, value):
+        if not s.INGREDIENT_INDEX_IN_MEMORY:
+            return queryset.filter(name__istartswith=value)
+        return queryset.filter(id__in=ingredient_index.search(
+            value, s.INGREDIENT_SEARCH_LIMIT))
+
+    def filter_search(self, queryset, name, value):
+        return search_ingredients(
+            queryset, value, s.INGREDIENT_SEARCH_LIMIT)
 
 
 class RecipeFilter(filters.FilterSet):
     author = filters.ModelChoiceFilter(
         queryset=User.objects.all())
     is_in_shopping_cart = filters.BooleanFilter(
+        method='filter_is_in_shopping_cart',
         widget=filters.widgets.BooleanWidget(),
         label='Находится в корзине')
     is_favorited = filters.BooleanFilter(
+        method='filter_is_favorited',
         widget=filters.widgets.BooleanWidget(),
         label='Находится в избранных.')
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         queryset=Tag.objects.all(),
         to_field_name='slug',
+        method='filter_tags',
+        distinct=False,
     )
 
     class Meta:
         model = Recipe
         fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+
+    def filter_tags(self, queryset, name, value):
+        """id IN (подзапрос): несколько тегов не размножают строки."""
+
+        if not value:
+            return queryset
+        return queryset.filter(id__in=Recipe.tags.through.objects.filter(
+            tag__in=value).values('recipe_id'))
+
+    def filter_by_user_rows(self, queryset, model, value):
+        """EXISTS по строкам (user, recipe) — проба уникального индекса."""
+
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+        rows = Exists(model.objects.filter(user=user, recipe=OuterRef('id')))
+        return queryset.filter(rows) if value else queryset.exclude(rows)
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_by_user_rows(queryset, FavoriteRecipe, value)
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_by_user_rows(queryset, ShoppingCart, value)
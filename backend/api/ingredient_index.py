@@ -0,0 +1,149 @@
+import bisect
+import re
+import threading
+import time
+
+from django.db import connection
+from django.db.models import Case, Count, IntegerField, Max, Q, Value, When
+from recipes.models import Ingredient
+
+from api.cache import get_catalog_version
+from foodgram import settings as s
+
+
+def get_trigrams(text):
+    """Триграммы слов в том виде, в каком их строит pg_trgm."""
+
+    trigrams = set()
+    for word in re.findall(r'\w+', text.casefold()):
+        word = f'  {word} '
+        trigrams.update(
+            word[index:index + 3] for index in range(len(word) - 2))
+    return frozenset(trigrams)
+
+
+def get_similarity(first, second):
+    if not first or not second:
+        return 0
+    return len(first & second) / len(first | second)
+
+
+class IngredientIndex:
+    """Отсортированный массив названий ингредиентов в памяти процесса.
+
+    Поиск по префиксу — бинарный поиск по массиву. Индекс перестраивается,
+    когда меняется версия справочника ингредиентов (см. api.cache).
+    Независимо от кэша раз в CATALOG_VERSION_TIMEOUT секунд индекс
+    сверяет число ингредиентов и наибольший id с базой.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.fingerprint = None
+        self.checked = 0
+        self.entries = ((), (), ())
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_fingerprint():
+        return Ingredient.objects.aggregate(count=Count('id'), last=Max('id'))
+
+    def is_fresh(self, version):
+        if version != self.version:
+            return False
+        if time.monotonic() - self.checked < s.CATALOG_VERSION_TIMEOUT:
+            return True
+        if self.get_fingerprint() != self.fingerprint:
+            return False
+        self.checked = time.monotonic()
+        return True
+
+    def refresh(self):
+        version = get_catalog_version(Ingredient)
+        if self.is_fresh(version):
+            return
+        with self.lock:
+            if self.is_fresh(version):
+                return
+            fingerprint = self.get_fingerprint()
+            rows = sorted(
+                (name.casefold(), id) for id, name
+                in Ingredient.objects.values_list('id', 'name').iterator())
+            self.entries = (
+                tuple(row[0] for row in rows),
+                tuple(row[1] for row in rows),
+                tuple(get_trigrams(row[0]) for row in rows))
+            self.version = version
+            self.fingerprint = fingerprint
+            self.checked = time.monotonic()
+
+    def search(self, prefix, limit):
+        """Id первых limit ингредиентов с названием, начинающимся с prefix."""
+
+        self.refresh()
+        names, ids, _ = self.entries
+        prefix = prefix.casefold()
+        found = []
+        position = bisect.bisect_left(names, prefix)
+        while (
+                position < len(names) and len(found) < limit
+                and names[position].startswith(prefix)):
+            found.append(ids[position])
+            position += 1
+        return found
+
+    def rank(self, query, limit):
+        """Id ингредиентов: сначала по префиксу, затем по подстроке,
+        затем по сходству триграмм не ниже INGREDIENT_TRIGRAM_THRESHOLD.
+        """
+
+        found = self.search(query, limit)
+        names, ids, trigrams = self.entries
+        query = query.casefold()
+        seen = set(found)
+        for name, id in zip(names, ids):
+            if len(found) >= limit:
+                return found
+            if id not in seen and query in name:
+                found.append(id)
+                seen.add(id)
+        query_trigrams = get_trigrams(query)
+        similar = sorted(
+            (-similarity, name, id)
+            for name, id, similarity in (
+                (name, id, get_similarity(query_trigrams, name_trigrams))
+                for name, id, name_trigrams in zip(names, ids, trigrams)
+                if id not in seen)
+            if similarity >= s.INGREDIENT_TRIGRAM_THRESHOLD)
+        found.extend(id for _, _, id in similar[:limit - len(found)])
+        return found
+
+
+ingredient_index = IngredientIndex()
+
+
+def search_ingredients(queryset, query, limit):
+    """Ранжированный поиск ингредиентов одним запросом к базе.
+
+    На PostgreSQL ранжирует сама база с помощью pg_trgm, на остальных
+    базах ранжирование выполняет индекс в памяти.
+    """
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return queryset.annotate(
+            rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                When(name__icontains=query, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField()),
+            similarity=TrigramSimilarity('name', query),
+        ).filter(
+            Q(name__icontains=query) | Q(name__trigram_similar=query)
+        ).order_by('rank', '-similarity', 'name')[:limit]
+    ids = ingredient_index.rank(query, limit)
+    return queryset.filter(id__in=ids).order_by(Case(
+        *(When(id=id, then=Value(position))
+          for position, id in enumerate(ids)),
+        output_field=IntegerField()))
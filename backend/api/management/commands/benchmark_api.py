@@ -0,0 +1,156 @@
+import json
+import math
+import time
+
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+
+def percentile(timings, share):
+    ordered = sorted(timings)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = ('Замер основных эндпоинтов API через тестовый клиент Django: '
+            'p50/p95 и количество SQL-запросов в формате JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Количество замеров каждого эндпоинта')
+        parser.add_argument(
+            '--user', type=int,
+            help='id пользователя (по умолчанию — с наибольшей корзиной '
+                 'среди тех, у кого есть подписки)')
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Значение заголовка Host')
+        parser.add_argument(
+            '--output',
+            help='Файл для результата в JSON')
+        parser.add_argument(
+            '--baseline',
+            help='Результат прошлого запуска для сравнения')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым замером: без этого все замеры, '
+                 'кроме разогревочного, попадают в кэш количества, PDF, '
+                 'справочников и токенов')
+
+    def get_user(self, user_id):
+        if user_id is not None:
+            return User.objects.get(id=user_id)
+        user = User.objects.annotate(
+            cart_size=Count('shopping_cart', distinct=True)
+        ).filter(
+            cart_size__gt=0, follower__isnull=False
+        ).order_by('-cart_size', 'id').first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователя с корзиной и подписками, '
+                'запустите manage.py seed_data')
+        return user
+
+    def get_endpoints(self, user):
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if recipe is None or ingredient is None:
+            raise CommandError('В базе нет рецептов или ингредиентов')
+        tags = '&'.join(
+            f'tags={slug}' for slug in
+            Tag.objects.values_list('slug', flat=True)[:2])
+        return {
+            'recipes_list': '/api/recipes/',
+            'recipes_list_tags': f'/api/recipes/?{tags}',
+            'recipes_list_author': f'/api/recipes/?author={recipe.author_id}',
+            'recipes_list_favorited': '/api/recipes/?is_favorited=1',
+            'recipes_list_in_cart': '/api/recipes/?is_in_shopping_cart=1',
+            'recipes_list_page_10': '/api/recipes/?page=10',
+            'recipes_list_cursor': '/api/recipes/?cursor=',
+            'recipe_detail': f'/api/recipes/{recipe.id}/',
+            'subscriptions': '/api/users/subscriptions/?recipes_limit=3',
+            'ingredients_prefix':
+                f'/api/ingredients/?name={ingredient.name[:2]}',
+            'ingredients_search':
+                f'/api/ingredients/?search={ingredient.name[:5]}',
+            'shopping_cart_txt':
+                '/api/recipes/download_shopping_cart/?format=txt',
+            'shopping_cart_pdf':
+                '/api/recipes/download_shopping_cart/?format=pdf',
+        }
+
+    def measure(self, client, path, repeat, cold):
+        timings, queries, status = [], 0, None
+        for attempt in range(repeat + 1):
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            if not attempt:
+                continue
+            timings.append(elapsed * 1000)
+            queries = max(queries, len(context))
+            status = response.status_code
+        return {
+            'path': path,
+            'status': status,
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'queries': queries,
+        }
+
+    def compare(self, results, baseline_path, cold):
+        with open(baseline_path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline.get('cold', False) != cold:
+            raise CommandError(
+                'Прошлый запуск сделан в другом режиме кэша, '
+                'сравнивать холодные и тёплые замеры нельзя')
+        baseline = baseline['endpoints']
+        for name, result in results.items():
+            if name in baseline and baseline[name]['p50_ms']:
+                result['p50_vs_baseline'] = round(
+                    result['p50_ms'] / baseline[name]['p50_ms'], 2)
+                result['queries_vs_baseline'] = (
+                    result['queries'] - baseline[name]['queries'])
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        client = Client(
+            HTTP_HOST=options['host'],
+            HTTP_AUTHORIZATION=f'Token {token.key}')
+        results = {
+            name: self.measure(
+                client, path, options['repeat'], options['cold'])
+            for name, path in self.get_endpoints(user).items()}
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['cold'])
+        report = json.dumps({
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'user': user.id,
+            'repeat': options['repeat'],
+            'cold': options['cold'],
+            'endpoints': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        self.stdout.write(report)
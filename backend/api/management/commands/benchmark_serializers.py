@@ -0,0 +1,98 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from recipes.models import Recipe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import ImageField, ListSerializer, Serializer
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+from api.fields import ImageURLField
+from api.serializers import RecipeReadSerializer
+
+IMAGE_FIELDS = ('image', 'image_thumbnail', 'image_webp')
+
+
+class Command(BaseCommand):
+    help = ('Сравнение стоимости вывода списка рецептов: вложенные '
+            'сериализаторы DRF и RecipeListSerializer, ImageField '
+            'и ImageURLField')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=1000,
+            help='Количество рецептов из базы')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество повторов')
+        parser.add_argument(
+            '--user', type=int,
+            help='id пользователя, от имени которого строится список')
+
+    def get_request(self, user_id):
+        request = Request(APIRequestFactory().get(
+            '/api/recipes/', HTTP_HOST='localhost'))
+        request.user = (
+            User.objects.get(id=user_id) if user_id else AnonymousUser())
+        return request
+
+    def best_of(self, build, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = build()
+            timings.append(time.perf_counter() - started)
+        return min(timings), JSONRenderer().render(data)
+
+    def images(self, field_class, recipes, context):
+        fields = []
+        for name in IMAGE_FIELDS:
+            field = field_class(read_only=True)
+            field.bind(name, Serializer(context=context))
+            fields.append((name, field.to_representation))
+        return [
+            [to_representation(getattr(recipe, name))
+             for name, to_representation in fields]
+            for recipe in recipes]
+
+    def handle(self, *args, **options):
+        request = self.get_request(options['user'])
+        recipes = list(RecipeReadSerializer.setup_eager_loading(
+            Recipe.objects.all(), request)[:options['limit']])
+        if not recipes:
+            raise CommandError('В базе нет рецептов')
+        for recipe in recipes:
+            # У рецептов из seed_data нет картинок: имена задаются только
+            # в памяти, чтобы замер включал построение ссылок.
+            for name in IMAGE_FIELDS:
+                if not getattr(recipe, name):
+                    setattr(recipe, name, f'static/recipe/{recipe.id}.jpg')
+        context = {'request': request}
+        nested, nested_json = self.best_of(lambda: ListSerializer(
+            recipes, child=RecipeReadSerializer(), context=context).data,
+            options['repeat'])
+        compact, compact_json = self.best_of(lambda: RecipeReadSerializer(
+            recipes, many=True, context=context).data, options['repeat'])
+        if nested_json != compact_json:
+            raise CommandError('Вывод сериализаторов различается')
+        drf_images, drf_images_json = self.best_of(
+            lambda: self.images(ImageField, recipes, context),
+            options['repeat'])
+        url_images, url_images_json = self.best_of(
+            lambda: self.images(ImageURLField, recipes, context),
+            options['repeat'])
+        if drf_images_json != url_images_json:
+            raise CommandError('Ссылки на картинки различаются')
+        for title, elapsed in (
+                ('Вложенные сериализаторы', nested),
+                ('RecipeListSerializer', compact),
+                ('Картинки через ImageField', drf_images),
+                ('Картинки через ImageURLField', url_images)):
+            self.stdout.write(
+                f'{title}: {elapsed * 1e6 / len(recipes):.1f} мкс на рецепт')
+        self.stdout.write(self.style.SUCCESS(
+            f'Вывод совпадает байт в байт, рецептов: {len(recipes)}, '
+            f'ускорение в {nested / compact:.1f} раза, картинки '
+            f'в {drf_images / url_images:.1f} раза'))
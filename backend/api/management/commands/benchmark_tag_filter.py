@@ -0,0 +1,80 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.http import QueryDict
+from recipes.models import Recipe, Tag
+from users.models import User
+
+from api.filters import RecipeFilter
+from foodgram import settings as s
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = ('Сравнение фильтра по тегам: JOIN + DISTINCT и id IN (подзапрос). '
+            'Тестовые данные создаются в транзакции и откатываются')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=100000,
+            help='Количество тестовых рецептов')
+        parser.add_argument(
+            '--tags', type=int, default=5,
+            help='Количество тегов у каждого рецепта')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество повторов каждого запроса')
+
+    def seed(self, recipes, tags):
+        author = User.objects.create(
+            username='benchmark', email='benchmark@example.com',
+            first_name='benchmark', last_name='benchmark')
+        slugs = [f'benchmark-{i}' for i in range(tags)]
+        Tag.objects.bulk_create(
+            Tag(name=slug, color=f'#{i:06X}', slug=slug)
+            for i, slug in enumerate(slugs))
+        tag_ids = list(Tag.objects.filter(
+            slug__in=slugs).values_list('id', flat=True))
+        through = Recipe.tags.through
+        for start in range(0, recipes, BATCH_SIZE):
+            Recipe.objects.bulk_create(
+                Recipe(author=author, name=f'benchmark {i}', text='benchmark',
+                       cooking_time=s.MIN_COOKING_TIME)
+                for i in range(start, min(start + BATCH_SIZE, recipes)))
+        through.objects.bulk_create((
+            through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in Recipe.objects.filter(
+                author=author).values_list('id', flat=True).iterator()
+            for tag_id in tag_ids), batch_size=BATCH_SIZE)
+        return slugs
+
+    def best_of(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    def report(self, title, queryset, repeat):
+        page_size = s.REST_FRAMEWORK['PAGE_SIZE']
+        count_ms = self.best_of(queryset.count, repeat)
+        page_ms = self.best_of(lambda: list(queryset[:page_size]), repeat)
+        self.stdout.write(
+            f'{title}: count={queryset.count()} за {count_ms:.1f} мс, '
+            f'страница за {page_ms:.1f} мс')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            slugs = self.seed(options['recipes'], options['tags'])
+            data = QueryDict(mutable=True)
+            data.setlist('tags', slugs)
+            joined = Recipe.objects.filter(tags__slug__in=slugs).distinct()
+            subquery = RecipeFilter(
+                data=data, queryset=Recipe.objects.all()).qs
+            self.report('JOIN + DISTINCT', joined, options['repeat'])
+            self.report('id IN (подзапрос)', subquery, options['repeat'])
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Тестовые данные удалены'))
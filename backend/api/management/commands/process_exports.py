@@ -0,0 +1,89 @@
+import time
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from recipes.models import ShoppingCartExport
+
+from api.shopping_list import export_shopping_list
+from foodgram import settings as s
+
+PRUNE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Обработка очереди выгрузок списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать очередь и завершить работу')
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза между опросами пустой очереди, секунд')
+
+    def claim(self):
+        """Следующая задача из очереди.
+
+        Задачи в статусе processing дольше EXPORT_PROCESSING_TIMEOUT
+        секунд считаются брошенными (обработчик упал) и берутся заново.
+        """
+
+        now = timezone.now()
+        stale = now - timedelta(seconds=s.EXPORT_PROCESSING_TIMEOUT)
+        with transaction.atomic():
+            export = ShoppingCartExport.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                Q(status=ShoppingCartExport.PENDING)
+                | Q(status=ShoppingCartExport.PROCESSING, started__lt=stale)
+                | Q(status=ShoppingCartExport.PROCESSING, started=None)
+            ).order_by('id').first()
+            if export is None:
+                return None
+            export.status = ShoppingCartExport.PROCESSING
+            export.started = now
+            export.save(update_fields=('status', 'started'))
+            return export
+
+    def prune(self):
+        """Удаляет выгрузки, завершённые раньше EXPORT_KEEP_TIMEOUT."""
+
+        expired = timezone.now() - timedelta(seconds=s.EXPORT_KEEP_TIMEOUT)
+        pruned = 0
+        for export in ShoppingCartExport.objects.filter(
+                finished__lt=expired).iterator():
+            export.file.delete(save=False)
+            export.delete()
+            pruned += 1
+        return pruned
+
+    def process(self, export):
+        try:
+            export_shopping_list(export)
+            export.status = ShoppingCartExport.DONE
+        except Exception as error:
+            export.status = ShoppingCartExport.FAILED
+            self.stderr.write(f'Выгрузка {export.id}: {error}')
+        export.finished = timezone.now()
+        export.save(update_fields=('file', 'status', 'finished'))
+
+    def handle(self, *args, **options):
+        processed = pruned = 0
+        next_prune = 0
+        while True:
+            if time.monotonic() >= next_prune:
+                pruned += self.prune()
+                next_prune = time.monotonic() + PRUNE_INTERVAL
+            export = self.claim()
+            if export is not None:
+                self.process(export)
+                processed += 1
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано выгрузок: {processed}, удалено старых: {pruned}'))
@@ -1,6 +1,197 @@
+import base64
+import binascii
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from foodgram import settings as s
+
+
+def get_count_cache_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.sha256(f'{sql}{params}'.encode()).hexdigest()
+    return f'pagination:count:{digest}'
+
+
+def estimate_count(queryset):
+    """Оценка планировщика PostgreSQL вместо COUNT(*)."""
+
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_queryset(queryset):
+    """Количество объектов и признак того, что оно приблизительное."""
+
+    if connections[queryset.db].vendor == 'postgresql':
+        estimate = estimate_count(queryset)
+        if estimate > s.APPROXIMATE_COUNT_THRESHOLD:
+            return estimate, True
+    return queryset.count(), False
+
+
+class ApproximatePage(Page):
+
+    def has_next(self):
+        if self.paginator.approximate:
+            return len(self.object_list) == self.paginator.per_page
+        return super().has_next()
+
+
+class CachedCountPaginator(Paginator):
+    """Количество кэшируется по SQL запроса на короткое время.
+
+    Подпись строится по `values('pk')`: аннотации вроде is_favorited
+    не попадают в запрос, поэтому без фильтров по пользователю
+    количество общее для всех.
+    """
+
+    approximate = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by().values('pk')
+        key = get_count_cache_key(queryset)
+        result = cache.get(key)
+        if result is None:
+            result = count_queryset(queryset)
+            cache.set(key, result, s.PAGINATION_COUNT_CACHE_TIMEOUT)
+        count, self.approximate = result
+        return count
+
+    def validate_number(self, number):
+        """Оценка может быть меньше реального количества."""
+
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.approximate or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.approximate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def _get_page(self, *args, **kwargs):
+        return ApproximatePage(*args, **kwargs)
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('count', self.page.paginator.count),
+            ('approximate_count', self.page.paginator.approximate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        )))
+
+
+class KeysetPagination(LimitPageNumberPagination):
+    """Номера страниц по умолчанию, с параметром `cursor` — курсор.
+
+    Курсор хранит ключ (ordering) последнего объекта страницы, поэтому
+    любая страница — это поиск по индексу без OFFSET и COUNT(*).
+    Пустой `cursor` открывает первую страницу.
+    """
+
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = request.query_params.get(self.cursor_query_param)
+        if self.keyset is None:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        size = self.get_page_size(request)
+        field, tiebreak = (name.lstrip('-') for name in self.ordering)
+        reverse, position = self.decode_cursor(queryset.model, field)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            value, pk = position
+            lookup = 'lt' if ordering[0].startswith('-') else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}e': value}),
+                Q(**{f'{field}__{lookup}': value})
+                | Q(**{f'{field}': value, f'{tiebreak}__{lookup}': pk}))
+        results = list(queryset[:size + 1])
+        has_more = len(results) > size
+        results = results[:size]
+        if reverse:
+            results.reverse()
+        self.next = self.previous = None
+        if results and (has_more or reverse):
+            self.next = self.encode_cursor(results[-1], False)
+        if results and (has_more if reverse else position is not None):
+            self.previous = self.encode_cursor(results[0], True)
+        return results
+
+    def decode_cursor(self, model, field):
+        if not self.keyset:
+            return False, None
+        try:
+            reverse, value, pk = json.loads(
+                base64.urlsafe_b64decode(self.keyset.encode()))
+            value = model._meta.get_field(field).to_python(value)
+            if (isinstance(pk, bool) or not isinstance(pk, int)
+                    or not 0 < pk < 2 ** 63):
+                raise ValueError(pk)
+            return bool(reverse), (value, pk)
+        except (binascii.Error, TypeError, ValueError, OverflowError,
+                ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        field, tiebreak = (name.lstrip('-') for name in self.ordering)
+        position = json.dumps((
+            int(reverse),
+            instance._meta.get_field(field).value_to_string(instance),
+            getattr(instance, tiebreak)))
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            base64.urlsafe_b64encode(position.encode()).decode())
+
+    def get_paginated_response(self, data):
+        if self.keyset is None:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict((
+            ('next', self.next),
+            ('previous', self.previous),
+            ('results', data),
+        )))
+
+
+class SubscriptionPagination(KeysetPagination):
+    ordering = ('-created', '-id')
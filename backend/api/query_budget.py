@@ -0,0 +1,176 @@
+import logging
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from time import perf_counter
+
+from django.db import connections
+from rest_framework.serializers import ListSerializer
+
+from foodgram import settings as s
+
+logger = logging.getLogger('api.queries')
+
+
+class QueryBudgetExceededError(Exception):
+    pass
+
+
+class QueryStats:
+    """Счётчик SQL-запросов запроса, подключается через execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+        self.database = 0.0
+        self.serializer = 0.0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - started
+            self.count += 1
+            self.database += elapsed
+            if elapsed * 1000 > s.SLOW_QUERY_MS:
+                logger.warning(
+                    'Медленный запрос %.1f мс: %s', elapsed * 1000, sql)
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'db_ms': round(self.database * 1000, 1),
+            'serializer_ms': round(self.serializer * 1000, 1),
+            'total_ms': round(self.total * 1000, 1),
+        }
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.database * 1000:.1f};desc="{self.count} queries"',
+            f'serializer;dur={self.serializer * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+
+class TimedDataMixin:
+    """Время вычисления serializer.data попадает в статистику запроса."""
+
+    @property
+    def data(self):
+        started = perf_counter()
+        try:
+            return super().data
+        finally:
+            stats = getattr(self.context.get('request'), 'query_stats', None)
+            if stats is not None:
+                stats.serializer += perf_counter() - started
+
+
+@lru_cache(maxsize=None)
+def get_timed_class(serializer_class):
+    """Подкласс сериализатора с TimedDataMixin.
+
+    Для many=True подменяется и list_serializer_class, потому что данные
+    тогда отдаёт список, а не сам сериализатор.
+    """
+
+    if issubclass(serializer_class, TimedDataMixin):
+        return serializer_class
+    attrs = {}
+    if not issubclass(serializer_class, ListSerializer):
+        meta = getattr(serializer_class, 'Meta', object)
+        attrs['Meta'] = type('Meta', (meta,), {
+            'list_serializer_class': get_timed_class(getattr(
+                meta, 'list_serializer_class', ListSerializer))})
+    return type(
+        serializer_class.__name__, (TimedDataMixin, serializer_class), attrs)
+
+
+class QueryBudgetMixin:
+    """Бюджет SQL-запросов для view: число или словарь по action."""
+
+    query_budget = None
+
+    def get_query_budget(self):
+        if isinstance(self.query_budget, dict):
+            return self.query_budget.get(getattr(self, 'action', None))
+        return self.query_budget
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        request._request.query_budget = self.get_query_budget()
+        request._request.query_view = '.'.join(filter(None, (
+            self.__class__.__name__, getattr(self, 'action', None))))
+
+    def get_serializer_class(self):
+        return get_timed_class(super().get_serializer_class())
+
+    def get_serializer(self, *args, **kwargs):
+        """Сериализатор с замером времени.
+
+        get_serializer_class, переопределённый в самом view, стоит в MRO
+        раньше миксина, поэтому класс оборачивается и здесь.
+        """
+
+        serializer_class = get_timed_class(self.get_serializer_class())
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
+
+
+class QueryBudgetMiddleware:
+    """Количество и время SQL-запросов в логах и в заголовке Server-Timing.
+
+    Заголовок добавляется только при SERVER_TIMING (по умолчанию в DEBUG).
+    Превышение бюджета view пишется в лог, а при QUERY_BUDGET_RAISE
+    (например, в тестах) поднимает QueryBudgetExceededError.
+
+    Запросы, выполненные во время отдачи потокового ответа, тоже
+    считаются, но заголовки к этому моменту уже отправлены, поэтому
+    итог такого ответа попадает только в лог.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    @contextmanager
+    def track(stats):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            yield
+
+    def __call__(self, request):
+        stats = request.query_stats = QueryStats()
+        started = perf_counter()
+        with self.track(stats):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, stats, started, response.streaming_content)
+            return response
+        stats.total = perf_counter() - started
+        if s.SERVER_TIMING:
+            response['Server-Timing'] = stats.server_timing()
+        self.report(request, stats)
+        return response
+
+    def stream(self, request, stats, started, content):
+        with self.track(stats):
+            yield from content
+        stats.total = perf_counter() - started
+        self.report(request, stats)
+
+    def report(self, request, stats):
+        view = getattr(request, 'query_view', None) or request.path
+        record = {'method': request.method, 'view': view, **stats.as_dict()}
+        logger.info(
+            ' '.join(f'{key}={value}' for key, value in record.items()),
+            extra={'query_stats': record})
+        budget = getattr(request, 'query_budget', None)
+        if budget is None or stats.count <= budget:
+            return
+        message = f'{view}: {stats.count} SQL-запросов при бюджете {budget}'
+        if s.QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceededError(message)
+        logger.warning(message, extra={'query_stats': record})
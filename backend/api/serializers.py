@@ -2,11 +2,19 @@ from foodgram import settings as s
 import django.contrib.auth.password_validation as validators
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.hashers import make_password
-from django.shortcuts import get_object_or_404
-from drf_base64.fields import Base64ImageField
+from django.db import connection, models, transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Value
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
 from rest_framework.validators import UniqueTogetherValidator
 from rest_framework import serializers
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Subscribe, Tag
+from rest_framework.exceptions import NotFound
+from recipes.cart import lock_recipe, update_carts
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, ShoppingCartExport,
+                            Subscribe, Tag)
+
+from api.fields import ImageURLField, StreamingBase64ImageField
 
 User = get_user_model()
 
@@ -58,12 +66,19 @@ class TokenSerializer(serializers.Serializer):
 
 
 class GetIsSubscribedMixin:
+    """Подписки пользователя читаются одним запросом на весь список."""
+
+    def get_subscribed_authors(self, user):
+        if 'subscribed_authors' not in self.context:
+            self.context['subscribed_authors'] = set(
+                user.follower.values_list('author_id', flat=True))
+        return self.context['subscribed_authors']
 
     def get_is_subscribed(self, obj):
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
-        return user.follower.filter(author=obj).exists()
+        return obj.id in self.get_subscribed_authors(user)
 
 
 class UserListSerializer(
@@ -186,13 +201,12 @@ class IngredientsEditSerializer(serializers.ModelSerializer):
 
 class RecipeAddSerializer(serializers.ModelSerializer):
     ingredients = IngredientsEditSerializer(many=True)
-    image = Base64ImageField(
+    image = StreamingBase64ImageField(
         max_length=None,
         use_url=True,
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
+    tags = serializers.ListField(
+        child=serializers.IntegerField()
     )
 
     class Meta:
@@ -202,28 +216,35 @@ class RecipeAddSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         ingredients = data['ingredients']
-        ingredient_list = []
         if not ingredients:
             raise serializers.ValidationError(
                 'Необходимо добавить хотя бы 1 ингредиент в рецепт')
+        ingredient_objects = Ingredient.objects.in_bulk(
+            {item['id'] for item in ingredients})
+        ingredient_list = set()
         for item in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=item['id'])
+            ingredient = ingredient_objects.get(item['id'])
+            if ingredient is None:
+                raise NotFound(
+                    f'Ингредиента с id {item["id"]} не существует')
             if int(item.get('amount')) < s.MIN_INGREDIENT_AMOUNT:
                 raise serializers.ValidationError(
                     f'Кол-во ингредиента - {ingredient} - '
                     f'не может быть меньше единицы')
-            if ingredient in ingredient_list:
+            if ingredient.id in ingredient_list:
                 raise serializers.ValidationError(
                     f'Ингредиент - {ingredient} - уже добавлен в рецепт')
-            ingredient_list.append(ingredient)
+            ingredient_list.add(ingredient.id)
         tags = data['tags']
         if not tags:
             raise serializers.ValidationError(
                 'Необходимо указать хотя бы один тэг')
-        for tag_name in tags:
-            if not Tag.objects.filter(name=tag_name).exists():
+        tag_objects = Tag.objects.in_bulk(set(tags))
+        for tag_id in tags:
+            if tag_id not in tag_objects:
                 raise serializers.ValidationError(
-                    f'Тэга - {tag_name} - не существует')
+                    f'Тэга - {tag_id} - не существует')
+        data['tags'] = list(tag_objects.values())
         cooking_time = data['cooking_time']
         if int(cooking_time) < s.MIN_COOKING_TIME:
             raise serializers.ValidationError(
@@ -231,13 +252,35 @@ class RecipeAddSerializer(serializers.ModelSerializer):
         return data
 
     def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            RecipeIngredient.objects.create(
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 recipe=recipe,
                 ingredient_id=ingredient.get('id'),
                 amount=ingredient.get('amount'),
-            )
-
+            ) for ingredient in ingredients)
+
+    def update_ingredients(self, ingredients, recipe):
+        """Меняет только отличающиеся строки и возвращает изменения."""
+
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        deltas, changed, removed = {}, [], []
+        for row in RecipeIngredient.objects.filter(recipe=recipe):
+            amount = amounts.pop(row.ingredient_id, 0)
+            deltas[row.ingredient_id] = amount - row.amount
+            if not amount:
+                removed.append(row.id)
+            elif amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        RecipeIngredient.objects.filter(id__in=removed).delete()
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        self.create_ingredients(
+            [{'id': id, 'amount': amount} for id, amount in amounts.items()],
+            recipe)
+        deltas.update(amounts)
+        return deltas
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -246,11 +289,12 @@ class RecipeAddSerializer(serializers.ModelSerializer):
         self.create_ingredients(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        lock_recipe(instance)
         if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
+            update_carts(instance, self.update_ingredients(
+                validated_data.pop('ingredients'), instance))
         if 'tags' in validated_data:
             instance.tags.set(
                 validated_data.pop('tags'))
@@ -258,15 +302,88 @@ class RecipeAddSerializer(serializers.ModelSerializer):
             instance, validated_data)
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = RecipeReadSerializer.setup_eager_loading(
+            Recipe.objects.filter(id=instance.id), request).get()
         return RecipeReadSerializer(
             instance,
             context={
-                'request': self.context.get('request')
+                'request': request
             }).data
 
 
+class RecipeListSerializer(
+        GetIsSubscribedMixin,
+        serializers.ListSerializer):
+    """Быстрый вывод списка рецептов.
+
+    Словари собираются прямо из предзагруженных строк, без вложенных
+    сериализаторов на каждый объект. Вывод совпадает с
+    RecipeReadSerializer байт в байт.
+    """
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, models.Manager) else data
+        fields = self.child.fields
+        image = fields['image'].to_representation
+        thumbnail = fields['image_thumbnail'].to_representation
+        webp = fields['image_webp'].to_representation
+        pub_date = fields['pub_date'].to_representation
+        user = self.context['request'].user
+        subscribed = (
+            self.get_subscribed_authors(user)
+            if user.is_authenticated else ())
+        tags = {}
+        result = []
+        for recipe in recipes:
+            author = recipe.author
+            recipe_tags = []
+            for tag in recipe.tags.all():
+                if tag.id not in tags:
+                    tags[tag.id] = {
+                        'id': tag.id,
+                        'name': tag.name,
+                        'color': tag.color,
+                        'slug': tag.slug,
+                    }
+                recipe_tags.append(tags[tag.id])
+            result.append({
+                'id': recipe.id,
+                'image': image(recipe.image),
+                'image_thumbnail': thumbnail(recipe.image_thumbnail),
+                'image_webp': webp(recipe.image_webp),
+                'tags': recipe_tags,
+                'author': {
+                    'email': author.email,
+                    'id': author.id,
+                    'username': author.username,
+                    'first_name': author.first_name,
+                    'last_name': author.last_name,
+                    'is_subscribed': author.id in subscribed,
+                },
+                'ingredients': [
+                    {
+                        'id': row.ingredient_id,
+                        'name': row.ingredient.name,
+                        'measurement_unit': row.ingredient.measurement_unit,
+                        'amount': row.amount,
+                    }
+                    for row in recipe.recipe.all()
+                ],
+                'is_favorited': bool(recipe.is_favorited),
+                'is_in_shopping_cart': bool(recipe.is_in_shopping_cart),
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'pub_date': pub_date(recipe.pub_date),
+            })
+        return result
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = ImageURLField()
+    image_thumbnail = ImageURLField()
+    image_webp = ImageURLField()
     tags = TagSerializer(
         many=True,
         read_only=True
@@ -290,13 +407,38 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = '__all__'
+        list_serializer_class = RecipeListSerializer
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, request):
+        """Только то, что читает сериализатор: автор, теги, ингредиенты."""
+
+        user = request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(FavoriteRecipe.objects.filter(
+                    user=user, recipe=OuterRef('id'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('id'))))
+        else:
+            queryset = queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False))
+        ingredients = RecipeIngredient.objects.select_related('ingredient')
+        return queryset.select_related('author').prefetch_related(
+            'tags', Prefetch('recipe', queryset=ingredients))
 
 
 class SubscribeRecipeSerializer(serializers.ModelSerializer):
+    image = ImageURLField()
+    image_thumbnail = ImageURLField()
+    image_webp = ImageURLField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = (
+            'id', 'name', 'image', 'image_thumbnail', 'image_webp',
+            'cooking_time')
 
 
 class SubscribeSerializer(serializers.ModelSerializer):
@@ -335,12 +477,81 @@ class SubscribeSerializer(serializers.ModelSerializer):
             )
         )
 
+    @staticmethod
+    def get_recipes_limit(request):
+        try:
+            limit = int(request.query_params.get('recipes_limit'))
+        except (TypeError, ValueError):
+            return None
+        return limit if limit >= 0 else None
+
+    @staticmethod
+    def get_limited_recipe_ids(subscriptions, limit):
+        """id первых limit рецептов каждого автора из subscriptions.
+
+        ROW_NUMBER() считается за один проход по рецептам этих авторов
+        (индекс recipe_author_pub_date_id_idx), а не подзапросом
+        с LIMIT на каждый рецепт.
+        """
+
+        authors, params = subscriptions.order_by().values(
+            'author_id').query.sql_with_params()
+        quote = connection.ops.quote_name
+        return RawSQL(
+            f'SELECT {quote("id")} FROM ('
+            f'SELECT {quote("id")}, ROW_NUMBER() OVER ('
+            f'PARTITION BY {quote("author_id")} '
+            f'ORDER BY {quote("pub_date")} DESC, {quote("id")} DESC'
+            f') AS position '
+            f'FROM {quote(Recipe._meta.db_table)} '
+            f'WHERE {quote("author_id")} IN ({authors})'
+            f') ranked WHERE position <= %s',
+            (*params, limit))
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, request):
+        """Счётчики и первые recipes_limit рецептов автора за один проход.
+
+        Лимит на автора задаётся оконной функцией, поэтому рецепты всех
+        авторов страницы загружаются одним запросом.
+        """
+
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'image_thumbnail', 'image_webp',
+            'cooking_time', 'author')
+        limit = cls.get_recipes_limit(request)
+        if limit is not None:
+            recipes = recipes.filter(
+                id__in=cls.get_limited_recipe_ids(queryset, limit))
+        return queryset.select_related('author').annotate(
+            recipes_count=Count('author__recipe'),
+            is_subscribed=Value(True),
+        ).order_by('-id').prefetch_related(Prefetch(
+            'author__recipe', queryset=recipes, to_attr='limited_recipes'))
+
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = (
-            obj.author.recipe.all()[:int(limit)] if limit
-            else obj.author.recipe.all())
+        recipes = getattr(obj.author, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.author.recipe.all()
+            limit = self.get_recipes_limit(self.context['request'])
+            if limit is not None:
+                recipes = recipes[:limit]
         return SubscribeRecipeSerializer(
             recipes,
             many=True).data
+
+
+class ShoppingCartExportSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ShoppingCartExport
+        fields = ('id', 'status', 'created', 'finished', 'url')
+        read_only_fields = ('status', 'created', 'finished')
+
+    def get_url(self, obj):
+        if obj.status != ShoppingCartExport.DONE:
+            return None
+        url = reverse('api:shopping_cart_exports-download', args=(obj.id,))
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,206 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import uuid
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.http import FileResponse, StreamingHttpResponse
+from recipes.models import ShoppingCartIngredient
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from foodgram import settings as s
+
+FONT_NAME = 'DejaVuSans'
+FONT_PATH = os.path.join(s.BASE_DIR, 'DejaVuSans.ttf')
+TITLE = 'Cписок покупок:'
+EMPTY_TITLE = 'Cписок покупок пуст!'
+
+RENDERERS = {}
+
+
+def get_shopping_list_queryset(user):
+    """Суммарное количество каждого ингредиента из корзины пользователя."""
+
+    return ShoppingCartIngredient.objects.filter(
+        user=user
+    ).order_by(
+        'ingredient__name'
+    ).values_list(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount')
+
+
+def get_shopping_list(user):
+    return tuple(get_shopping_list_queryset(user))
+
+
+def register_renderer(renderer_class):
+    """Декоратор: добавляет формат списка покупок в реестр."""
+
+    RENDERERS[renderer_class.format] = renderer_class()
+    return renderer_class
+
+
+def get_renderer(format):
+    return RENDERERS.get(format)
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """Параметр `format` выбирает формат списка, а не рендерер DRF."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ShoppingListRenderer:
+    format = None
+    media_type = None
+
+    @property
+    def filename(self):
+        return f'{os.path.splitext(s.FILENAME)[0]}.{self.format}'
+
+    def response(self, user):
+        raise NotImplementedError
+
+
+class StreamingShoppingListRenderer(ShoppingListRenderer):
+    """Строки списка отдаются клиенту по мере чтения из базы."""
+
+    def render(self, rows):
+        raise NotImplementedError
+
+    def response(self, user):
+        response = StreamingHttpResponse(
+            self.render(get_shopping_list_queryset(user).iterator()),
+            content_type=self.media_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{self.filename}"')
+        return response
+
+
+@register_renderer
+class TextRenderer(StreamingShoppingListRenderer):
+    format = 'txt'
+    media_type = 'text/plain; charset=utf-8'
+
+    def render(self, rows):
+        index = 0
+        for index, (name, unit, amount) in enumerate(rows, start=1):
+            if index == 1:
+                yield f'{TITLE}\n'
+            yield f'{index}. {name} - {amount} {unit}.\n'
+        if not index:
+            yield f'{EMPTY_TITLE}\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+@register_renderer
+class CSVRenderer(StreamingShoppingListRenderer):
+    format = 'csv'
+    media_type = 'text/csv; charset=utf-8'
+
+    def render(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in rows:
+            yield writer.writerow(row)
+
+
+@register_renderer
+class JSONRenderer(StreamingShoppingListRenderer):
+    format = 'json'
+    media_type = 'application/json'
+
+    def render(self, rows):
+        separator = '['
+        for name, unit, amount in rows:
+            yield separator + json.dumps(
+                {'name': name, 'measurement_unit': unit, 'amount': amount},
+                ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    """Регистрирует шрифт один раз на процесс."""
+
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def render_pdf(shopping_list):
+    """Отрисовка списка покупок в PDF."""
+
+    register_fonts()
+    buffer = io.BytesIO()
+    page = canvas.Canvas(buffer)
+    x_position, y_position = 50, 800
+    if not shopping_list:
+        page.setFont(FONT_NAME, 24)
+        page.drawString(x_position, y_position, EMPTY_TITLE)
+        page.save()
+        return buffer.getvalue()
+    indent = 20
+    page.setFont(FONT_NAME, 14)
+    page.drawString(x_position, y_position, TITLE)
+    for index, (name, unit, amount) in enumerate(shopping_list, start=1):
+        page.drawString(
+            x_position, y_position - indent,
+            f'{index}. {name} - {amount} {unit}.')
+        y_position -= 15
+        if y_position <= 50:
+            page.showPage()
+            page.setFont(FONT_NAME, 14)
+            y_position = 800
+    page.save()
+    return buffer.getvalue()
+
+
+def get_cache_key(shopping_list):
+    digest = hashlib.sha256(repr(shopping_list).encode()).hexdigest()
+    return f'shopping_list:pdf:{digest}'
+
+
+def get_pdf(shopping_list):
+    """PDF из кэша; ReportLab запускается только для нового содержимого."""
+
+    key = get_cache_key(shopping_list)
+    document = cache.get(key)
+    if document is None:
+        document = render_pdf(shopping_list)
+        cache.set(key, document, s.SHOPPING_LIST_CACHE_TIMEOUT)
+    return document
+
+
+@register_renderer
+class PDFRenderer(ShoppingListRenderer):
+    format = 'pdf'
+    media_type = 'application/pdf'
+
+    def response(self, user):
+        return FileResponse(
+            io.BytesIO(get_pdf(get_shopping_list(user))),
+            as_attachment=True,
+            filename=self.filename,
+            content_type=self.media_type)
+
+
+def export_shopping_list(export):
+    """Формирует файл для задачи выгрузки списка покупок."""
+
+    document = get_pdf(get_shopping_list(export.user))
+    export.file.save(
+        f'{uuid.uuid4().hex}.pdf', ContentFile(document), save=False)
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Ingredient, Tag
+from recipes.signals import catalog_changed
+from rest_framework.authtoken.models import Token
+
+from api.authentication import forget_token, forget_user, get_token_key
+from api.cache import touch_catalog
+
+
+@receiver(catalog_changed)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def reset_catalog_cache(sender, **kwargs):
+    touch_catalog(sender)
+
+
+@receiver(post_delete, sender=Token)
+def reset_token_cache(sender, instance, **kwargs):
+    forget_token(get_token_key(instance.key), instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def reset_user_token_cache(sender, instance, **kwargs):
+    forget_user(instance.id)
@@ -0,0 +1,212 @@
+import base64
+import io
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from PIL import Image
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, Subscribe,
+                            Tag)
+from rest_framework.request import Request
+from rest_framework.serializers import ImageField, Serializer
+from rest_framework.test import APIRequestFactory, APITestCase
+from users.models import User
+
+from api.fields import ImageURLField
+from foodgram import settings as s
+
+
+class QueryCountTestCase(APITestCase):
+    """Число запросов к БД не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user('reader')
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', color=f'#00000{index}',
+                slug=f'tag-{index}')
+            for index in range(2)]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(3)]
+
+    @staticmethod
+    def create_user(username):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com',
+            first_name=username, last_name=username, password='password')
+
+    def create_recipes(self, count):
+        """count рецептов разных авторов, на всех подписан self.user."""
+
+        User.objects.exclude(id=self.user.id).delete()
+        for index in range(count):
+            author = self.create_user(f'author{index}')
+            Subscribe.objects.create(user=self.user, author=author)
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10)
+            recipe.tags.set(self.tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=index + 1)
+                for ingredient in self.ingredients)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, queries):
+        cache.clear()
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+
+class IsSubscribedQueryTest(QueryCountTestCase):
+    """is_subscribed считается одним запросом на страницу (N+1 нет)."""
+
+    def test_recipe_list(self):
+        for count in (1, 6):
+            with self.subTest(count=count):
+                self.create_recipes(count)
+                data = self.get('/api/recipes/?limit=6', 5)
+                self.assertEqual(len(data['results']), count)
+                self.assertTrue(all(
+                    recipe['author']['is_subscribed']
+                    for recipe in data['results']))
+
+    def test_user_list(self):
+        for count in (1, 6):
+            with self.subTest(count=count):
+                self.create_recipes(count)
+                data = self.get('/api/users/?limit=10', 4)
+                self.assertEqual(len(data['results']), count + 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RecipeQueryPlanTest(QueryCountTestCase):
+    """Запросы RecipesViewSet по action; бюджеты view тоже проверяются."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(s, 'QUERY_BUDGET_RAISE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.create_recipes(3)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_list(self):
+        self.get('/api/recipes/', 5)
+
+    def test_list_anonymous(self):
+        self.client.force_authenticate(None)
+        self.get('/api/recipes/', 4)
+
+    def test_retrieve(self):
+        recipe = Recipe.objects.first()
+        data = self.get(f'/api/recipes/{recipe.id}/', 4)
+        self.assertEqual(len(data['ingredients']), len(self.ingredients))
+
+    def test_create(self):
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(image, 'PNG')
+        cache.clear()
+        with self.assertNumQueries(12):
+            response = self.client.post('/api/recipes/', {
+                'name': 'Новый рецепт',
+                'text': 'Текст',
+                'cooking_time': 5,
+                'tags': [tag.id for tag in self.tags],
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': 2}
+                    for ingredient in self.ingredients],
+                'image': 'data:image/png;base64,'
+                         + base64.b64encode(image.getvalue()).decode(),
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(
+            len(response.json()['ingredients']), len(self.ingredients))
+
+
+class SubscriptionRecipesLimitTest(QueryCountTestCase):
+    """recipes_limit при большом числе рецептов у каждого автора."""
+
+    AUTHORS = 6
+    RECIPES_PER_AUTHOR = 300
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(self.AUTHORS)
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10)
+            for author in User.objects.exclude(id=self.user.id)
+            for index in range(self.RECIPES_PER_AUTHOR - 1))
+
+    def test_subscriptions_recipes_limit(self):
+        data = self.get('/api/users/subscriptions/?recipes_limit=3', 3)
+        self.assertEqual(len(data['results']), self.AUTHORS)
+        for author in data['results']:
+            expected = list(Recipe.objects.filter(
+                author_id=author['id']
+            ).order_by('-pub_date', '-id').values_list('id', flat=True)[:3])
+            self.assertEqual(
+                [recipe['id'] for recipe in author['recipes']], expected)
+            self.assertEqual(
+                author['recipes_count'], self.RECIPES_PER_AUTHOR)
+
+
+class ImageURLFieldBenchmarkTest(APITestCase):
+    """ImageURLField выдаёт то же, что ImageField, и заметно быстрее."""
+
+    RECIPES = 500
+    REPEAT = 5
+
+    def setUp(self):
+        request = Request(APIRequestFactory().get(
+            '/api/recipes/', HTTP_HOST='localhost'))
+        self.context = {'request': request}
+        self.recipes = [
+            Recipe(
+                id=index, image=f'static/recipe/{index}.jpg',
+                image_thumbnail=f'static/recipe/thumbnails/{index}.jpg',
+                image_webp=f'static/recipe/webp/{index}.webp')
+            for index in range(1, self.RECIPES + 1)]
+
+    def serialize(self, field_class):
+        fields = []
+        for name in ('image', 'image_thumbnail', 'image_webp'):
+            field = field_class(read_only=True)
+            field.bind(name, Serializer(context=self.context))
+            fields.append((name, field.to_representation))
+        return [
+            [to_representation(getattr(recipe, name))
+             for name, to_representation in fields]
+            for recipe in self.recipes]
+
+    def best_of(self, field_class):
+        timings = []
+        for _ in range(self.REPEAT):
+            started = time.perf_counter()
+            data = self.serialize(field_class)
+            timings.append(time.perf_counter() - started)
+        return min(timings), data
+
+    def test_faster_than_image_field(self):
+        image_field, expected = self.best_of(ImageField)
+        url_field, data = self.best_of(ImageURLField)
+        self.assertEqual(data, expected)
+        self.assertGreater(image_field / url_field, 2)
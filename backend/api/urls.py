@@ -2,7 +2,8 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 from api.views import (AddAndDeleteSubscribe, AddDeleteFavoriteRecipe,
                        AddDeleteShoppingCart, AuthToken, IngredientsViewSet,
-                       RecipesViewSet, TagsViewSet, UsersViewSet, set_password)
+                       RecipesViewSet, ShoppingCartExportViewSet, TagsViewSet,
+                       UsersViewSet, set_password)
 
 app_name = 'api'
 
@@ -11,6 +12,10 @@ router.register('users', UsersViewSet)
 router.register('tags', TagsViewSet)
 router.register('ingredients', IngredientsViewSet)
 router.register('recipes', RecipesViewSet, basename='recipes')
+router.register(
+    'shopping_cart/exports',
+    ShoppingCartExportViewSet,
+    basename='shopping_cart_exports')
 
 
 urlpatterns = [
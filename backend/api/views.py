@@ -1,34 +1,33 @@
-import io
-from foodgram import settings as s
-
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
-from django.db.models.aggregates import Count, Sum
-from django.db.models.expressions import Exists, OuterRef, Value
 from django.http import FileResponse
+from django.db.models.expressions import Exists, OuterRef, Value
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
-from recipes.models import (FavoriteRecipe, Ingredient, Recipe, ShoppingCart,
-                            Subscribe, Tag)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
-from rest_framework import generics, status, viewsets
+from recipes.cart import add_to_cart, remove_from_cart
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            ShoppingCartExport, Subscribe, Tag)
+from rest_framework import generics, mixins, status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import action, api_view
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import (SAFE_METHODS, AllowAny,
                                         IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 
+from api.cache import CatalogCacheMixin
 from api.filters import IngredientFilter, RecipeFilter
+from api.pagination import KeysetPagination, SubscriptionPagination
 from api.permissions import IsAdminOrReadOnly
+from api.query_budget import QueryBudgetMixin
 from api.serializers import (
     IngredientSerializer, RecipeAddSerializer, RecipeReadSerializer,
-    SubscribeRecipeSerializer, SubscribeSerializer, TagSerializer,
-    TokenSerializer, UserCreateSerializer, UserListSerializer,
-    UserPasswordSerializer)
+    ShoppingCartExportSerializer, SubscribeRecipeSerializer,
+    SubscribeSerializer, TagSerializer, TokenSerializer,
+    UserCreateSerializer, UserListSerializer, UserPasswordSerializer)
+from api.shopping_list import ShoppingListNegotiation, get_renderer
 from foodgram import settings as s
 
 User = get_user_model()
@@ -55,20 +54,17 @@ class PermissionAndPaginationMixin:
 
 
 class AddAndDeleteSubscribe(
+        QueryBudgetMixin,
         generics.RetrieveDestroyAPIView,
         generics.ListCreateAPIView):
     """Подписка/отписка для пользователей."""
 
     serializer_class = SubscribeSerializer
+    query_budget = 7
 
     def get_queryset(self):
-        return self.request.user.follower.select_related(
-            'following'
-        ).prefetch_related(
-            'following__recipe'
-        ).annotate(
-            recipes_count=Count('following__recipe'),
-            is_subscribed=Value(True),)
+        return SubscribeSerializer.setup_eager_loading(
+            self.request.user.follower.all(), self.request)
 
     def get_object(self):
         user_id = self.kwargs['user_id']
@@ -87,7 +83,7 @@ class AddAndDeleteSubscribe(
                 {'errors': 'Вы уже подписаны на данного пользователя'},
                 status=status.HTTP_400_BAD_REQUEST)
         subs = request.user.follower.create(author=instance)
-        serializer = self.get_serializer(subs)
+        serializer = self.get_serializer(self.get_queryset().get(id=subs.id))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def perform_destroy(self, instance):
@@ -95,39 +91,44 @@ class AddAndDeleteSubscribe(
 
 
 class AddDeleteFavoriteRecipe(
+        QueryBudgetMixin,
         GetObjectMixin,
         generics.RetrieveDestroyAPIView,
         generics.ListCreateAPIView):
     """Добавление и удаление рецепта из избранного."""
 
+    query_budget = 5
+
     def create(self, request, *args, **kwargs):
         instance = self.get_object()
-        fav_item, created = FavoriteRecipe.objects.get_or_create(
-            user=request.user)
-        request.user.favorite_recipe.recipe.add(instance)
+        FavoriteRecipe.objects.bulk_create(
+            (FavoriteRecipe(user=request.user, recipe=instance),),
+            ignore_conflicts=True)
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def perform_destroy(self, instance):
-        self.request.user.favorite_recipe.recipe.remove(instance)
+        FavoriteRecipe.objects.filter(
+            user=self.request.user, recipe=instance).delete()
 
 
 class AddDeleteShoppingCart(
+        QueryBudgetMixin,
         GetObjectMixin,
         generics.RetrieveDestroyAPIView,
         generics.ListCreateAPIView):
     """Добавление и удаление рецепта из корзины."""
 
+    query_budget = 16
+
     def create(self, request, *args, **kwargs):
         instance = self.get_object()
-        purchase, created = ShoppingCart.objects.get_or_create(
-            user=request.user)
-        request.user.shopping_cart.recipe.add(instance)
+        add_to_cart(request.user, instance)
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def perform_destroy(self, instance):
-        self.request.user.shopping_cart.recipe.remove(instance)
+        remove_from_cart(self.request.user, instance)
 
 
 class AuthToken(ObtainAuthToken):
@@ -146,9 +147,10 @@ class AuthToken(ObtainAuthToken):
             status=status.HTTP_201_CREATED)
 
 
-class UsersViewSet(UserViewSet):
+class UsersViewSet(QueryBudgetMixin, UserViewSet):
 
     permission_classes = (IsAuthenticated,)
+    query_budget = {'list': 6, 'retrieve': 5, 'me': 2, 'subscriptions': 5}
 
     def get_queryset(self):
         return User.objects.annotate(
@@ -163,6 +165,8 @@ class UsersViewSet(UserViewSet):
     def get_serializer_class(self):
         if self.request.method.lower() == 'post':
             return UserCreateSerializer
+        if self.action == 'subscriptions':
+            return SubscribeSerializer
         return UserListSerializer
 
     def perform_create(self, serializer):
@@ -171,23 +175,25 @@ class UsersViewSet(UserViewSet):
 
     @action(
         detail=False,
-        permission_classes=(IsAuthenticated,))
+        permission_classes=(IsAuthenticated,),
+        pagination_class=SubscriptionPagination)
     def subscriptions(self, request):
         """Получить список подписок."""
 
-        user = request.user
-        queryset = Subscribe.objects.filter(user=user)
+        queryset = SubscribeSerializer.setup_eager_loading(
+            Subscribe.objects.filter(user=request.user), request)
         pages = self.paginate_queryset(queryset)
-        serializer = SubscribeSerializer(
-            pages, many=True,
-            context={'request': request})
+        serializer = self.get_serializer(pages, many=True)
         return self.get_paginated_response(serializer.data)
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
 
     filterset_class = RecipeFilter
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    pagination_class = KeysetPagination
+    query_budget = {'list': 7, 'retrieve': 6}
+    parser_classes = (JSONParser, MultiPartParser)
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -195,24 +201,10 @@ class RecipesViewSet(viewsets.ModelViewSet):
         return RecipeAddSerializer
 
     def get_queryset(self):
-        if self.request.user.is_authenticated:
-            return Recipe.objects.annotate(
-                is_favorited=Exists(
-                    FavoriteRecipe.objects.filter(
-                        user=self.request.user, recipe=OuterRef('id'))),
-                is_in_shopping_cart=Exists(
-                    ShoppingCart.objects.filter(
-                        user=self.request.user, recipe=OuterRef('id')))
-                        ).select_related('author').prefetch_related(
-                            'tags', 'ingredients', 'recipe',
-                            'shopping_cart', 'favorite_recipe')
-        else:
-            return Recipe.objects.annotate(
-                is_in_shopping_cart=Value(False),
-                is_favorited=Value(False),
-                    ).select_related('author').prefetch_related(
-                    'tags', 'ingredients', 'recipe',
-                    'shopping_cart', 'favorite_recipe')
+        if self.action in ('list', 'retrieve'):
+            return RecipeReadSerializer.setup_eager_loading(
+                Recipe.objects.all(), self.request)
+        return Recipe.objects.all()
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -220,67 +212,72 @@ class RecipesViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=(IsAuthenticated,))
+        permission_classes=(IsAuthenticated,),
+        content_negotiation_class=ShoppingListNegotiation)
     def download_shopping_cart(self, request):
-        """Скачивание рецепта."""
-
-        buffer = io.BytesIO()
-        page = canvas.Canvas(buffer)
-        pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
-        x_position, y_position = 50, 800
-        page.setFont('DejaVuSans', 14)
-
-        shopping_cart = (
-            request.user.shopping_cart.recipe.
-            values(
-                'ingredients__name',
-                'ingredients__measurement_unit'
-            ).annotate(amount=Sum('recipe__amount')))
-
-        if not shopping_cart:
-            page.setFont('DejaVuSans', 24)
-            page.drawString(
-                x_position,
-                y_position,
-                'Cписок покупок пуст!')
-            page.save()
-            buffer.seek(0)
-            return FileResponse(
-                buffer, as_attachment=True, filename=s.FILENAME)
-        else:
-            indent = 20
-            page.drawString(x_position, y_position, 'Cписок покупок:')
-            for index, recipe in enumerate(shopping_cart, start=1):
-                page.drawString(
-                    x_position, y_position - indent,
-                    f'{index}. {recipe["ingredients__name"]} - '
-                    f'{recipe["amount"]} '
-                    f'{recipe["ingredients__measurement_unit"]}.')
-                y_position -= 15
-                if y_position <= 50:
-                    page.showPage()
-                    y_position = 800
-            page.save()
-            buffer.seek(0)
-            return FileResponse(
-                buffer, as_attachment=True, filename=s.FILENAME)
+        """Скачивание списка покупок в формате pdf, txt, csv или json."""
+
+        format = request.query_params.get('format', 'pdf')
+        renderer = get_renderer(format)
+        if renderer is None:
+            return Response(
+                {'errors': f'Формат {format} не поддерживается'},
+                status=status.HTTP_400_BAD_REQUEST)
+        return renderer.response(request.user)
+
+
+class ShoppingCartExportViewSet(
+        QueryBudgetMixin,
+        mixins.CreateModelMixin,
+        mixins.RetrieveModelMixin,
+        viewsets.GenericViewSet):
+    """Фоновая выгрузка списка покупок."""
+
+    serializer_class = ShoppingCartExportSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return ShoppingCartExport.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        """Скачивание готового списка покупок."""
+
+        export = self.get_object()
+        if export.status != ShoppingCartExport.DONE:
+            return Response(
+                {'errors': 'Список покупок ещё не сформирован'},
+                status=status.HTTP_400_BAD_REQUEST)
+        return FileResponse(
+            export.file.open('rb'),
+            as_attachment=True,
+            filename=s.FILENAME)
 
 
 class TagsViewSet(
+        QueryBudgetMixin,
+        CatalogCacheMixin,
         PermissionAndPaginationMixin,
         viewsets.ModelViewSet):
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    query_budget = {'list': 3, 'retrieve': 3}
 
 
 class IngredientsViewSet(
+        QueryBudgetMixin,
+        CatalogCacheMixin,
         PermissionAndPaginationMixin,
         viewsets.ModelViewSet):
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filterset_class = IngredientFilter
+    query_budget = {'list': 4, 'retrieve': 3}
 
 
 @api_view(['post'])
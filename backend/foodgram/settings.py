@@ -7,6 +7,20 @@ load_dotenv()
 MIN_COOKING_TIME = 1
 MIN_INGREDIENT_AMOUNT = 1
 FILENAME = 'shopping_cart.pdf'
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+CATALOG_CACHE_TIMEOUT = 60 * 60
+CATALOG_VERSION_TIMEOUT = 60
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_TRIGRAM_THRESHOLD = 0.3
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+SLOW_QUERY_MS = 500
+EXPORT_PROCESSING_TIMEOUT = 60 * 10
+EXPORT_KEEP_TIMEOUT = 60 * 60 * 24
+RECIPE_IMAGE_SIZE = (1280, 1280)
+RECIPE_THUMBNAIL_SIZE = (400, 400)
+RECIPE_IMAGE_QUALITY = 85
+RECIPE_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_SPOOL_SIZE = 1024 * 1024
 
 BASE_DIR = os.path.dirname(
     os.path.dirname(os.path.abspath(__file__)))
@@ -18,6 +32,21 @@ SECRET_KEY = os.getenv(
 
 DEBUG = os.getenv('DEBUG', default='True') == 'True'
 
+SERVER_TIMING = os.getenv('SERVER_TIMING', default=str(DEBUG)) == 'True'
+
+INGREDIENT_INDEX_IN_MEMORY = os.getenv(
+    'INGREDIENT_INDEX_IN_MEMORY', default='True') == 'True'
+
+APPROXIMATE_COUNT_THRESHOLD = int(os.getenv(
+    'APPROXIMATE_COUNT_THRESHOLD', default=100000))
+
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE', default='False') == 'True'
+
+RECIPE_IMAGE_MAX_BYTES = int(os.getenv(
+    'RECIPE_IMAGE_MAX_BYTES', default=10 * 1024 * 1024))
+
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', default=60))
+
 ALLOWED_HOSTS = os.environ.get(
     'ALLOWED_HOSTS', default='localhost').split(', ')
 ALLOWED_HOSTS = [] if not any(ALLOWED_HOSTS) else ALLOWED_HOSTS
@@ -31,6 +60,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
@@ -41,6 +71,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +113,30 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.queries': {
+            'handlers': ['console'],
+            'level': os.getenv('QUERY_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -120,7 +175,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
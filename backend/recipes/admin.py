@@ -1,8 +1,10 @@
 from django.contrib import admin
 
+from recipes.cart import (add_to_cart, get_amounts, lock_recipe,
+                          remove_from_cart, update_carts)
 from recipes.models import (
     FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
-    ShoppingCart, Subscribe, Tag)
+    ShoppingCart, ShoppingCartExport, ShoppingCartIngredient, Subscribe, Tag)
 
 
 class RecipeIngredientAdmin(admin.StackedInline):
@@ -23,6 +25,21 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('pub_date', 'tags',)
     inlines = (RecipeIngredientAdmin,)
 
+    def save_formset(self, request, form, formset, change):
+        """Изменения ингредиентов переносятся в итоги корзин с рецептом."""
+
+        if formset.model is not RecipeIngredient:
+            super().save_formset(request, form, formset, change)
+            return
+        recipe = form.instance
+        lock_recipe(recipe)
+        before = get_amounts(recipe)
+        super().save_formset(request, form, formset, change)
+        after = get_amounts(recipe)
+        update_carts(recipe, {
+            ingredient: after.get(ingredient, 0) - before.get(ingredient, 0)
+            for ingredient in before.keys() | after.keys()})
+
     @admin.display(
         description='Электронная почта')
     def get_author(self, obj):
@@ -75,7 +92,7 @@ class SubscribeAdmin(admin.ModelAdmin):
 
 @admin.register(FavoriteRecipe)
 class FavoriteRecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'get_recipe', 'get_count', 'get_tags')
+    list_display = ('id', 'user', 'recipe', 'created')
     search_fields = (
         'recipe__name',
         'user__username',
@@ -83,28 +100,10 @@ class FavoriteRecipeAdmin(admin.ModelAdmin):
     )
     list_filter = ('recipe__tags',)
 
-    @admin.display(description='Тэги')
-    def get_tags(self, obj):
-        tags_obj = obj.recipe.values('tags__name')
-        return [
-            f'{item["tags__name"]} ' for item in tags_obj
-        ]
-
-    @admin.display(description='Рецепты')
-    def get_recipe(self, obj):
-        return [
-            f'{item["name"]} ' for item in obj.recipe.values('name')[:10]
-        ]
-
-    @admin.display(description='В избранных')
-    def get_count(self, obj):
-        return obj.recipe.count()
-
 
 @admin.register(ShoppingCart)
 class SoppingCartAdmin(admin.ModelAdmin):
-    list_display = (
-        'id', 'user', 'get_recipe', 'get_count', 'get_tags')
+    list_display = ('id', 'user', 'recipe', 'created')
     search_fields = (
         'recipe__name',
         'user__username',
@@ -112,19 +111,40 @@ class SoppingCartAdmin(admin.ModelAdmin):
     )
     list_filter = ('recipe__tags',)
 
-    @admin.display(description='Рецепты')
-    def get_recipe(self, obj):
-        return [
-            f'{item["name"]} ' for item in obj.recipe.values('name')[:10]
-        ]
+    def has_change_permission(self, request, obj=None):
+        return False
 
-    @admin.display(description='Рецепт в избранных')
-    def get_count(self, obj):
-        return obj.recipe.count()
+    def save_model(self, request, obj, form, change):
+        """Добавление через add_to_cart, чтобы обновились итоги корзины."""
 
-    @admin.display(description='Тэги')
-    def get_tags(self, obj):
-        tags_obj = obj.recipe.values('tags__name')
-        return [
-            f'{item["tags__name"]} ' for item in tags_obj
-        ]
+        add_to_cart(obj.user, obj.recipe)
+        obj.pk = ShoppingCart.objects.get(user=obj.user, recipe=obj.recipe).pk
+
+    def delete_model(self, request, obj):
+        remove_from_cart(obj.user, obj.recipe)
+
+    def delete_queryset(self, request, queryset):
+        for purchase in queryset.select_related('user', 'recipe'):
+            remove_from_cart(purchase.user, purchase.recipe)
+
+
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'amount')
+    search_fields = ('user__email', 'user__username', 'ingredient__name')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ShoppingCartExport)
+class ShoppingCartExportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'created', 'finished')
+    search_fields = ('user__email', 'user__username')
+    list_filter = ('status',)
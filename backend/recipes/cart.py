@@ -0,0 +1,138 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import (Recipe, RecipeIngredient, ShoppingCart,
+                            ShoppingCartIngredient)
+
+User = get_user_model()
+
+
+def lock_users(user_ids):
+    """Блокирует пользователей, чтобы итоги корзин менялись по очереди."""
+
+    list(User.objects.select_for_update().filter(
+        id__in=user_ids).order_by('id').values_list('id', flat=True))
+
+
+def lock_recipe(recipe):
+    """Блокирует рецепт до чтения его ингредиентов и корзин с ним.
+
+    Без блокировки добавление в корзину может прочитать старые
+    количества, а одновременное изменение рецепта — не увидеть ещё
+    не сохранённую строку корзины, и итоги разойдутся. Рецепт всегда
+    блокируется раньше пользователей, чтобы не было взаимоблокировок.
+    """
+
+    list(Recipe.objects.select_for_update().filter(
+        id=recipe.id).values_list('id', flat=True))
+
+
+def get_amounts(recipe):
+    return dict(RecipeIngredient.objects.filter(
+        recipe=recipe).values_list('ingredient_id', 'amount'))
+
+
+@transaction.atomic
+def apply_deltas(user_ids, deltas):
+    """Прибавляет изменения количества ингредиентов к итогам корзин."""
+
+    user_ids = list(user_ids)
+    deltas = {
+        ingredient: delta for ingredient, delta in deltas.items() if delta}
+    if not user_ids or not deltas:
+        return
+    lock_users(user_ids)
+    changed, emptied, found = [], [], set()
+    for total in ShoppingCartIngredient.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas):
+        found.add((total.user_id, total.ingredient_id))
+        total.amount += deltas[total.ingredient_id]
+        if total.amount > 0:
+            changed.append(total)
+        else:
+            emptied.append(total.id)
+    ShoppingCartIngredient.objects.bulk_update(changed, ('amount',))
+    ShoppingCartIngredient.objects.filter(id__in=emptied).delete()
+    ShoppingCartIngredient.objects.bulk_create(
+        ShoppingCartIngredient(
+            user_id=user_id, ingredient_id=ingredient, amount=delta)
+        for user_id in user_ids
+        for ingredient, delta in deltas.items()
+        if delta > 0 and (user_id, ingredient) not in found)
+
+
+@transaction.atomic
+def add_to_cart(user, recipe):
+    lock_recipe(recipe)
+    lock_users((user.id,))
+    purchase, created = ShoppingCart.objects.get_or_create(
+        user=user, recipe=recipe)
+    if not created:
+        return False
+    apply_deltas((user.id,), get_amounts(recipe))
+    return True
+
+
+@transaction.atomic
+def remove_from_cart(user, recipe):
+    lock_recipe(recipe)
+    lock_users((user.id,))
+    deleted, _ = ShoppingCart.objects.filter(
+        user=user, recipe=recipe).delete()
+    if not deleted:
+        return False
+    apply_deltas(
+        (user.id,),
+        {ingredient: -amount
+         for ingredient, amount in get_amounts(recipe).items()})
+    return True
+
+
+def get_cart_users(recipe):
+    return ShoppingCart.objects.filter(
+        recipe=recipe).values_list('user_id', flat=True)
+
+
+def update_carts(recipe, deltas):
+    """Переносит изменение ингредиентов рецепта в корзины с ним.
+
+    Рецепт должен быть заблокирован lock_recipe в той же транзакции
+    до чтения старых количеств.
+    """
+
+    apply_deltas(get_cart_users(recipe), deltas)
+
+
+@transaction.atomic
+def remove_recipe_from_carts(recipe):
+    lock_recipe(recipe)
+    apply_deltas(
+        get_cart_users(recipe),
+        {ingredient: -amount
+         for ingredient, amount in get_amounts(recipe).items()})
+
+
+def calculate_totals():
+    """Итоги всех корзин, посчитанные заново по рецептам."""
+
+    rows = RecipeIngredient.objects.filter(
+        recipe__shopping_cart__user__isnull=False
+    ).values(
+        'recipe__shopping_cart__user', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
+    return {
+        (row['recipe__shopping_cart__user'], row['ingredient']): row['total']
+        for row in rows.iterator()}
+
+
+@transaction.atomic
+def rebuild_totals(expected=None):
+    if expected is None:
+        expected = calculate_totals()
+    ShoppingCartIngredient.objects.all().delete()
+    ShoppingCartIngredient.objects.bulk_create(
+        (ShoppingCartIngredient(
+            user_id=user_id, ingredient_id=ingredient, amount=amount)
+         for (user_id, ingredient), amount in expected.items()),
+        batch_size=1000)
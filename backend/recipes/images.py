@@ -0,0 +1,59 @@
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from foodgram import settings as s
+
+
+def encode(image, format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+
+def content_file(data, extension):
+    return ContentFile(
+        data, f'{hashlib.sha256(data).hexdigest()}.{extension}')
+
+
+def resize(image, size):
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    return image
+
+
+def process_image(file):
+    """Картинка рецепта декодируется один раз и сохраняется в трёх видах.
+
+    Основной файл уменьшается до RECIPE_IMAGE_SIZE и перекодируется
+    без метаданных (EXIF, GPS, ICC), к нему добавляются миниатюра
+    RECIPE_THUMBNAIL_SIZE и WebP-версия. Файлы называются по sha256
+    содержимого. Возвращает словарь {имя поля: ContentFile}.
+    """
+
+    file.seek(0)
+    with Image.open(file) as source:
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        format, extension = 'PNG', 'png'
+    else:
+        image = image.convert('RGB')
+        format, extension = 'JPEG', 'jpg'
+    # Писатели PNG и WebP берут icc_profile и exif из image.info.
+    image.info.clear()
+    image = resize(image, s.RECIPE_IMAGE_SIZE)
+    options = {'optimize': True}
+    if format == 'JPEG':
+        options['quality'] = s.RECIPE_IMAGE_QUALITY
+    return {
+        'image': content_file(encode(image, format, **options), extension),
+        'image_thumbnail': content_file(
+            encode(resize(image, s.RECIPE_THUMBNAIL_SIZE), format, **options),
+            extension),
+        'image_webp': content_file(
+            encode(image, 'WEBP', quality=s.RECIPE_IMAGE_QUALITY), 'webp'),
+    }
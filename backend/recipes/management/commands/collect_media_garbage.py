@@ -0,0 +1,84 @@
+import os
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand
+from django.db.models import Q
+
+from recipes.models import Recipe
+
+IMAGE_FIELDS = ('image', 'image_thumbnail', 'image_webp')
+
+
+class Command(BaseCommand):
+    help = ('Удаление картинок рецептов, на которые не ссылается '
+            'ни один рецепт')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько файлов проверять одним запросом')
+        parser.add_argument(
+            '--min-age', type=int, default=60,
+            help='Не трогать файлы моложе стольких минут: ссылка на них '
+                 'может быть ещё не сохранена в базе')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено')
+
+    def scan(self, storage, directory, max_mtime):
+        """Имена файлов каталога по одному, без списка в памяти."""
+
+        try:
+            with os.scandir(storage.path(directory)) as entries:
+                for entry in entries:
+                    if (entry.is_file(follow_symlinks=False)
+                            and entry.stat().st_mtime < max_mtime):
+                        yield directory + entry.name, entry.stat().st_size
+        except FileNotFoundError:
+            return
+
+    def is_stale(self, storage, name, max_mtime):
+        """Файл всё ещё старый: его могли пересохранить после scan."""
+
+        try:
+            return os.stat(storage.path(name)).st_mtime < max_mtime
+        except FileNotFoundError:
+            return False
+
+    def get_referenced(self, names):
+        lookup = Q()
+        for field in IMAGE_FIELDS:
+            lookup |= Q(**{f'{field}__in': names})
+        referenced = set()
+        for row in Recipe.objects.filter(lookup).values_list(*IMAGE_FIELDS):
+            referenced.update(row)
+        return referenced
+
+    def handle(self, *args, **options):
+        max_mtime = time.time() - options['min_age'] * 60
+        directories = {}
+        for name in IMAGE_FIELDS:
+            field = Recipe._meta.get_field(name)
+            directories[field.upload_to] = field.storage
+        deleted = freed = 0
+        for directory, storage in directories.items():
+            files = self.scan(storage, directory, max_mtime)
+            while True:
+                batch = dict(islice(files, options['batch_size']))
+                if not batch:
+                    break
+                referenced = self.get_referenced(batch.keys())
+                for name, size in batch.items():
+                    if name in referenced or not self.is_stale(
+                            storage, name, max_mtime):
+                        continue
+                    if options['dry_run']:
+                        self.stdout.write(name)
+                    else:
+                        storage.delete(name)
+                    deleted += 1
+                    freed += size
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Будет удалено" if options["dry_run"] else "Удалено"} '
+            f'файлов: {deleted}, {freed / 1024 / 1024:.1f} МБ'))
@@ -1,36 +1,105 @@
+import csv
+import io
 import json
 import os
+from itertools import islice
 
 from django.conf import settings
 from django.core.management import BaseCommand, CommandError
-from django.db.utils import IntegrityError
+from django.db import connection, transaction
 
 from recipes.models import Ingredient
+from recipes.signals import catalog_changed
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+BATCH_SIZE = 1000
+
+
+def read_json(file):
+    for ingredient in json.load(file):
+        yield ingredient['name'], ingredient['measurement_unit']
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+READERS = {'.json': read_json, '.csv': read_csv}
 
 
 class Command(BaseCommand):
-    help = 'Загрузка из csv файла'
+    help = 'Загрузка ингредиентов из json или csv файла'
 
     def add_arguments(self, parser):
         parser.add_argument('filename', default='ingredients.json', nargs='?',
                             type=str)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL')
+
+    def read(self, reader, file):
+        for name, unit in reader(file):
+            self.total += 1
+            yield name.strip(), unit.strip()
+
+    def bulk_insert(self, rows):
+        """Пакеты INSERT ... ON CONFLICT DO NOTHING по unique_ingredient."""
+
+        before = Ingredient.objects.count()
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                break
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in batch),
+                ignore_conflicts=True)
+        return Ingredient.objects.count() - before
+
+    def copy_insert(self, rows):
+        """COPY во временную таблицу и один INSERT ... SELECT."""
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP')
+            cursor.copy_expert(
+                'COPY ingredient_import FROM STDIN WITH (FORMAT csv)', buffer)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_import '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING')
+            return cursor.rowcount
 
     def handle(self, *args, **options):
+        path = os.path.join(DATA_ROOT, options['filename'])
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы json и csv')
+        use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy'])
+        self.total = 0
         try:
-            with open(os.path.join(DATA_ROOT, options['filename']), 'r',
-                      encoding='utf-8') as f:
-                data = json.load(f)
-                for ingredient in data:
-                    try:
-                        Ingredient.objects.create(name=ingredient["name"],
-                                                  measurement_unit=ingredient[
-                                                      "measurement_unit"])
-                    except IntegrityError:
-                        print(f'Ингридиет {ingredient["name"]} '
-                              f'{ingredient["measurement_unit"]} '
-                              f'уже есть в базе')
-
+            with open(path, encoding='utf-8', newline='') as file:
+                with transaction.atomic():
+                    rows = self.read(reader, file)
+                    inserted = (
+                        self.copy_insert(rows) if use_copy
+                        else self.bulk_insert(rows))
         except FileNotFoundError:
             raise CommandError('Файл отсутствует в директории data')
+        except (KeyError, IndexError, ValueError) as error:
+            raise CommandError(f'Неверный формат файла: {error}')
+        catalog_changed.send(sender=Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты загружены: добавлено {inserted}, '
+            f'пропущено {self.total - inserted}'))
@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+from django.db.models import Q
+
+from recipes.images import process_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Миниатюры и WebP-версии для картинок, загруженных ранее'
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).filter(
+                Q(image_webp__isnull=True) | Q(image_webp=''))
+        for recipe in recipes.iterator():
+            try:
+                with recipe.image.open('rb') as file:
+                    renditions = process_image(file)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+                continue
+            for field, content in renditions.items():
+                getattr(recipe, field).save(
+                    content.name, content, save=False)
+            recipe.save(update_fields=renditions.keys())
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {processed}, с ошибками: {failed}'))
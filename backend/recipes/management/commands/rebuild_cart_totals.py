@@ -0,0 +1,33 @@
+from django.core.management import BaseCommand, CommandError
+
+from recipes.cart import calculate_totals, rebuild_totals
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт итогов корзин покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сравнить итоги, ничего не изменяя')
+
+    def handle(self, *args, **options):
+        expected = calculate_totals()
+        current = {
+            (user_id, ingredient): amount
+            for user_id, ingredient, amount
+            in ShoppingCartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'amount').iterator()}
+        mismatched = [
+            key for key in expected.keys() | current.keys()
+            if expected.get(key) != current.get(key)]
+        if options['check']:
+            if mismatched:
+                raise CommandError(
+                    f'Итоги корзин расходятся: {len(mismatched)}')
+            self.stdout.write(self.style.SUCCESS('Итоги корзин совпадают'))
+            return
+        rebuild_totals(expected)
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги корзин пересчитаны, исправлено: {len(mismatched)}'))
@@ -0,0 +1,145 @@
+import json
+import os
+import random
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.cart import rebuild_totals
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Subscribe, Tag)
+from recipes.signals import catalog_changed
+
+User = get_user_model()
+
+DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+TAGS = (
+    {'name': 'Завтрак', 'color': '#E26C2D', 'slug': 'breakfast'},
+    {'name': 'Обед', 'color': '#49B64E', 'slug': 'dinner'},
+    {'name': 'Ужин', 'color': '#8775D2', 'slug': 'supper'},
+)
+
+
+class Command(BaseCommand):
+    help = 'Наполнение базы синтетическими данными для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Количество пользователей')
+        parser.add_argument(
+            '--recipes', type=int, default=1000,
+            help='Количество рецептов')
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Ингредиентов в рецепте')
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Подписок у каждого пользователя')
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Избранных рецептов у каждого пользователя')
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Рецептов в корзине у каждого пользователя')
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имён пользователей')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пакета bulk_create')
+
+    def load_tags(self):
+        Tag.objects.bulk_create(
+            (Tag(**tag) for tag in TAGS), ignore_conflicts=True)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def load_ingredients(self):
+        with open(os.path.join(DATA_ROOT, 'ingredients.json'),
+                  encoding='utf-8') as file:
+            data = json.load(file)
+        existing = set(Ingredient.objects.values_list(
+            'name', 'measurement_unit'))
+        Ingredient.objects.bulk_create(
+            (Ingredient(**ingredient) for ingredient in data
+             if (ingredient['name'], ingredient['measurement_unit'])
+             not in existing),
+            batch_size=self.batch_size)
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_users(self, count, prefix):
+        password = make_password(prefix)
+        User.objects.bulk_create(
+            (User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com',
+                  first_name=prefix, last_name=str(i), password=password)
+             for i in range(count)),
+            batch_size=self.batch_size, ignore_conflicts=True)
+        return list(User.objects.filter(
+            username__startswith=prefix).values_list('id', flat=True))
+
+    def create_recipes(self, count, users, tags, ingredients, per_recipe):
+        before = Recipe.objects.filter(author__in=users).count()
+        Recipe.objects.bulk_create(
+            (Recipe(author_id=self.random.choice(users),
+                    name=f'Рецепт {i}', text=f'Описание рецепта {i}',
+                    cooking_time=self.random.randint(1, 180))
+             for i in range(count)),
+            batch_size=self.batch_size)
+        recipes = list(Recipe.objects.filter(
+            author__in=users).order_by('id').values_list(
+                'id', flat=True)[before:])
+        Recipe.tags.through.objects.bulk_create(
+            (Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+             for recipe in recipes
+             for tag in self.random.sample(
+                 tags, self.random.randint(1, len(tags)))),
+            batch_size=self.batch_size)
+        RecipeIngredient.objects.bulk_create(
+            (RecipeIngredient(
+                recipe_id=recipe, ingredient_id=ingredient,
+                amount=self.random.randint(1, 500))
+             for recipe in recipes
+             for ingredient in self.random.sample(
+                 ingredients, min(per_recipe, len(ingredients)))),
+            batch_size=self.batch_size)
+        return recipes
+
+    def create_links(self, model, field, users, targets, per_user):
+        """Подписки, избранное и корзина: per_user случайных объектов."""
+
+        model.objects.bulk_create(
+            (model(user_id=user, **{f'{field}_id': target})
+             for user in users
+             for target in self.random.sample(
+                 targets, min(per_user, len(targets)))
+             if field != 'author' or target != user),
+            batch_size=self.batch_size, ignore_conflicts=True)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        tags = self.load_tags()
+        ingredients = self.load_ingredients()
+        users = self.create_users(options['users'], options['prefix'])
+        recipes = self.create_recipes(
+            options['recipes'], users, tags, ingredients,
+            options['ingredients_per_recipe'])
+        self.create_links(
+            Subscribe, 'author', users, users, options['subscriptions'])
+        self.create_links(
+            FavoriteRecipe, 'recipe', users, recipes, options['favorites'])
+        self.create_links(
+            ShoppingCart, 'recipe', users, recipes, options['cart'])
+        rebuild_totals()
+        catalog_changed.send(sender=Tag)
+        catalog_changed.send(sender=Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(users)}, рецептов {len(recipes)}, '
+            f'ингредиентов в базе {len(ingredients)}'))
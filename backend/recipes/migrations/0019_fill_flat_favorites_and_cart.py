@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+def flatten(apps, model_name):
+    Container = apps.get_model('recipes', model_name)
+    Through = Container.recipe.through
+    container_field = f'{model_name.lower()}__user_id'
+    pairs = list(Through.objects.filter(
+        **{f'{model_name.lower()}__user__isnull': False}
+    ).values_list(container_field, 'recipe_id'))
+    Container.objects.filter(recipe_item__isnull=True).delete()
+    Container.objects.bulk_create(
+        (Container(user_id=user_id, recipe_item_id=recipe_id)
+         for user_id, recipe_id in pairs),
+        batch_size=1000)
+
+
+def unflatten(apps, model_name):
+    Container = apps.get_model('recipes', model_name)
+    pairs = list(Container.objects.filter(
+        recipe_item__isnull=False).values_list('user_id', 'recipe_item_id'))
+    Container.objects.filter(recipe_item__isnull=False).delete()
+    containers = {}
+    for user_id, recipe_id in pairs:
+        if user_id not in containers:
+            containers[user_id] = Container.objects.create(user_id=user_id)
+        containers[user_id].recipe.add(recipe_id)
+
+
+def forwards(apps, schema_editor):
+    flatten(apps, 'FavoriteRecipe')
+    flatten(apps, 'ShoppingCart')
+
+
+def backwards(apps, schema_editor):
+    unflatten(apps, 'FavoriteRecipe')
+    unflatten(apps, 'ShoppingCart')
+
+
+class Migration(migrations.Migration):
+    """Шаг 2 из 3: перенос избранного и корзины в плоские строки."""
+
+    dependencies = [
+        ('recipes', '0018_flat_favorites_and_cart'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+def merge_duplicates(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    kept, duplicates = {}, {}
+    for ingredient_id, name, unit in Ingredient.objects.order_by(
+            'id').values_list('id', 'name', 'measurement_unit'):
+        key = (name, unit)
+        if key in kept:
+            duplicates[ingredient_id] = kept[key]
+        else:
+            kept[key] = ingredient_id
+    if not duplicates:
+        return
+    for model_name, owner in (
+            ('RecipeIngredient', 'recipe_id'),
+            ('ShoppingCartIngredient', 'user_id')):
+        model = apps.get_model('recipes', model_name)
+        for row in model.objects.filter(ingredient_id__in=duplicates):
+            target = duplicates[row.ingredient_id]
+            existing = model.objects.filter(
+                ingredient_id=target, **{owner: getattr(row, owner)}).first()
+            if existing is None:
+                row.ingredient_id = target
+                row.save(update_fields=('ingredient',))
+                continue
+            existing.amount += row.amount
+            existing.save(update_fields=('amount',))
+            row.delete()
+    Ingredient.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+    """Шаг 1 из 2: дубли ингредиентов сливаются с первой записью."""
+
+    dependencies = [
+        ('recipes', '0021_recipe_and_subscription_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.13 on 2026-10-18 03:02
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0024_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=recipes.storage.ContentAddressedStorage(), upload_to='static/recipe/', verbose_name='Картинка'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=recipes.storage.ContentAddressedStorage(), upload_to='static/recipe/thumbnails/', verbose_name='Миниатюра'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image_webp',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=recipes.storage.ContentAddressedStorage(), upload_to='static/recipe/webp/', verbose_name='Картинка WebP'),
+        ),
+    ]
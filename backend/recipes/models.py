@@ -4,6 +4,8 @@ from django.db import models
 from django.core.exceptions import ValidationError
 
 from foodgram import settings as s
+from recipes.images import process_image
+from recipes.storage import content_storage
 
 
 User = get_user_model()
@@ -24,6 +26,11 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit',),
+                name='unique_ingredient')
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}.'
@@ -69,9 +76,26 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='static/recipe/',
+        storage=content_storage,
         blank=False,
         null=True
     )
+    image_thumbnail = models.ImageField(
+        'Миниатюра',
+        upload_to='static/recipe/thumbnails/',
+        storage=content_storage,
+        blank=True,
+        null=True,
+        editable=False
+    )
+    image_webp = models.ImageField(
+        'Картинка WebP',
+        upload_to='static/recipe/webp/',
+        storage=content_storage,
+        blank=True,
+        null=True,
+        editable=False
+    )
     text = models.TextField(
         'Описание рецепта'
     )
@@ -100,7 +124,21 @@ class Recipe(models.Model):
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.image and not self.image._committed:
+            for field, content in process_image(self.image).items():
+                getattr(self, field).save(content.name, content, save=False)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.author.email}, {self.name}'
@@ -157,6 +195,11 @@ class Subscribe(models.Model):
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         ordering = ('-id',)
+        indexes = [
+            models.Index(
+                fields=('user', '-created', '-id'),
+                name='subscribe_user_created_id_idx')
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=('user', 'author',),
@@ -173,43 +216,134 @@ class Subscribe(models.Model):
 
 
 class FavoriteRecipe(models.Model):
-    user = models.OneToOneField(
+    user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        null=True,
         related_name='favorite_recipe',
         verbose_name='Пользователь')
-    recipe = models.ManyToManyField(
+    recipe = models.ForeignKey(
         Recipe,
+        on_delete=models.CASCADE,
         related_name='favorite_recipe',
         verbose_name='Избранный рецепт')
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True)
 
     class Meta:
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избранные рецепты'
+        ordering = ('-id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe',),
+                name='unique_favorite_recipe')
+        ]
 
     def __str__(self):
-        list_ = [item['name'] for item in self.recipe.values('name')]
-        return f'Пользователь {self.user} добавил {list_} в избранные.'
+        return f'Пользователь {self.user} добавил {self.recipe} в избранные.'
 
 
 class ShoppingCart(models.Model):
-    user = models.OneToOneField(
+    user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='shopping_cart',
-        null=True,
         verbose_name='Пользователь')
-    recipe = models.ManyToManyField(
+    recipe = models.ForeignKey(
         Recipe,
+        on_delete=models.CASCADE,
         related_name='shopping_cart',
         verbose_name='Покупка')
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True)
 
     class Meta:
         verbose_name = 'Покупка'
         verbose_name_plural = 'Покупки'
         ordering = ['-id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe',),
+                name='unique_shopping_cart')
+        ]
+
+    def __str__(self):
+        return f'Пользователь {self.user} добавил {self.recipe} в покупки.'
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Ингредиент')
+    amount = models.PositiveIntegerField(
+        'Количество',
+        default=0)
+
+    class Meta:
+        verbose_name = 'Ингредиент в корзине'
+        verbose_name_plural = 'Ингредиенты в корзине'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient',),
+                name='unique_shopping_cart_ingredient')
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.amount}'
+
+
+class ShoppingCartExport(models.Model):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Формируется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_exports',
+        verbose_name='Пользователь')
+    status = models.CharField(
+        'Статус',
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True)
+    file = models.FileField(
+        'Файл',
+        upload_to='exports/',
+        blank=True)
+    created = models.DateTimeField(
+        'Дата создания',
+        auto_now_add=True)
+    started = models.DateTimeField(
+        'Дата начала обработки',
+        null=True,
+        blank=True)
+    finished = models.DateTimeField(
+        'Дата завершения',
+        null=True,
+        blank=True)
+
+    class Meta:
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списков покупок'
+        ordering = ('-id',)
 
     def __str__(self):
-        list_ = [item['name'] for item in self.recipe.values('name')]
-        return f'Пользователь {self.user} добавил {list_} в покупки.'
+        return f'Выгрузка {self.id} пользователя {self.user}: {self.status}'
@@ -0,0 +1,13 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import Signal, receiver
+
+from recipes.cart import remove_recipe_from_carts
+from recipes.models import Recipe
+
+# Справочник изменён в обход save/delete (bulk_create, COPY).
+catalog_changed = Signal()
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe_from_carts(sender, instance, **kwargs):
+    remove_recipe_from_carts(instance)
@@ -0,0 +1,24 @@
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище картинок, имена которых — хэш содержимого.
+
+    Одинаковое имя означает одинаковое содержимое, поэтому повторная
+    загрузка не записывает файл заново, а возвращает уже сохранённый.
+    Время изменения такого файла обновляется, чтобы collect_media_garbage
+    не удалил его, пока новая ссылка на него ещё не сохранена в базе.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+content_storage = ContentAddressedStorage()
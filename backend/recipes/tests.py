@@ -0,0 +1,34 @@
+import io
+
+from django.test import SimpleTestCase
+from PIL import Image, ImageCms
+
+from recipes.images import process_image
+
+
+class ProcessImageTest(SimpleTestCase):
+    """Во всех версиях картинки нет ICC-профиля и EXIF."""
+
+    @staticmethod
+    def make_image(mode, format):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        exif[0x8825] = {1: 'N'}
+        icc_profile = ImageCms.ImageCmsProfile(
+            ImageCms.createProfile('sRGB')).tobytes()
+        file = io.BytesIO()
+        Image.new(mode, (50, 40)).save(
+            file, format, icc_profile=icc_profile, exif=exif.tobytes())
+        file.seek(0)
+        return file
+
+    def test_metadata_removed(self):
+        for mode, format in (
+                ('RGBA', 'PNG'), ('RGB', 'PNG'), ('RGB', 'JPEG')):
+            renditions = process_image(self.make_image(mode, format))
+            for field, content in renditions.items():
+                with self.subTest(mode=mode, format=format, field=field):
+                    with Image.open(io.BytesIO(content.read())) as image:
+                        self.assertNotIn('icc_profile', image.info)
+                        self.assertNotIn('exif', image.info)
+                        self.assertFalse(image.getexif())